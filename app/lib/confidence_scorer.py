@@ -5,9 +5,76 @@ Addresses the "always 1" confidence problem by using measurable criteria instead
 
 import re
 import math
-from typing import List, Dict, Tuple, Optional
+import functools
+from typing import List, Dict, Tuple, Optional, NamedTuple, Sequence, Union
 from dataclasses import dataclass
 import json
+import numpy as np
+
+try:
+    import ahocorasick  # Optional: single-pass keyword matching
+except ImportError:
+    ahocorasick = None
+
+def _is_word_char(char: str) -> bool:
+    """Same definition of a word character as \\w in the re module"""
+    return char.isalnum() or char == '_'
+
+_WORD_RE = re.compile(r'\w+')
+
+@functools.lru_cache(maxsize=8)
+def _word_set(text: str) -> frozenset:
+    """Whole words in text; cached so every criterion reuses one tokenization of an answer"""
+    return frozenset(_WORD_RE.findall(text))
+
+class _KeywordPattern:
+    """
+    Matches a list of lowercase keywords as whole words or phrases. Single-word
+    keywords are looked up in the answer's word set; phrases share one compiled
+    regex alternation, so one C-level scan replaces a substring test per keyword
+    """
+    
+    def __init__(self, keywords: Tuple[str, ...]):
+        self.keywords = keywords
+        # A keyword made only of word characters is a whole-word match exactly
+        # when it is one of the text's \w+ tokens
+        self._words = frozenset(k for k in keywords if _WORD_RE.fullmatch(k))
+        unique = sorted({k for k in keywords if k and k not in self._words},
+                        key=len, reverse=True)
+        
+        # The lookahead reports a match at every start position, longest keyword first
+        self._regex = None
+        if unique:
+            self._regex = re.compile(
+                r'(?=(?<!\w)(' + '|'.join(re.escape(k) for k in unique) + r')(?!\w))'
+            )
+        
+        # Shorter phrases hidden by a longer one matched at the same position
+        # (e.g. "x = 2" inside "x = 2 or x = 3")
+        self._implied = {
+            longer: tuple(k for k in unique
+                          if len(k) < len(longer) and longer.startswith(k)
+                          and not _is_word_char(longer[len(k)]))
+            for longer in unique
+        }
+    
+    def found(self, text: str) -> set:
+        """Set of keywords present in text; an empty keyword always matches"""
+        found = {''}
+        if self._words:
+            found.update(self._words & _word_set(text))
+        if self._regex is not None:
+            for keyword in self._regex.findall(text):
+                found.add(keyword)
+                found.update(self._implied[keyword])
+        return found
+    
+    def count(self, text: str) -> int:
+        """Number of keywords (counting duplicates in the list) present in text"""
+        if not self.keywords:
+            return 0
+        found = self.found(text)
+        return sum(1 for k in self.keywords if k in found)
 
 @dataclass
 class Criterion:
@@ -18,6 +85,70 @@ class Criterion:
     partial_credit_keywords: Optional[List[str]] = None
     tolerance: float = 0.1
 
+    def __post_init__(self):
+        # Lowercase keywords once so matching doesn't redo it for every answer
+        self._keywords_lc = tuple(k.lower() for k in self.keywords)
+        self._partial_keywords_lc = tuple(k.lower() for k in (self.partial_credit_keywords or []))
+        self._keyword_pattern = _KeywordPattern(self._keywords_lc)
+        self._partial_keyword_pattern = _KeywordPattern(self._partial_keywords_lc)
+
+@functools.lru_cache(maxsize=32)
+def _build_keyword_automaton(scheme_keywords: Tuple[Tuple[Tuple[str, ...], Tuple[str, ...]], ...]):
+    """
+    Build one Aho-Corasick automaton over every keyword in a mark scheme.
+    scheme_keywords holds (keywords, partial_credit_keywords) per criterion, so
+    identical mark schemes share a single automaton across student answers.
+    """
+    payloads = {}
+    for index, (keywords, partial_keywords) in enumerate(scheme_keywords):
+        for keyword in keywords:
+            payloads.setdefault(keyword, []).append((index, 0))
+        for keyword in partial_keywords:
+            payloads.setdefault(keyword, []).append((index, 1))
+    
+    # An empty keyword matches every answer, so count it up front
+    base_counts = [[0, 0] for _ in scheme_keywords]
+    for index, slot in payloads.pop('', []):
+        base_counts[index][slot] += 1
+    
+    if not payloads:
+        return None, base_counts
+    
+    automaton = ahocorasick.Automaton()
+    for keyword, payload in payloads.items():
+        automaton.add_word(keyword, (keyword, payload))
+    automaton.make_automaton()
+    
+    return automaton, base_counts
+
+class PreparedExpected(NamedTuple):
+    """Expected answer tokenized once for reuse across student answers"""
+    lower_text: str
+    words: frozenset
+    length: int
+
+@functools.lru_cache(maxsize=256)
+def _prepare_expected(expected_answer: str) -> PreparedExpected:
+    lower_text = expected_answer.lower()
+    tokens = lower_text.split()
+    return PreparedExpected(lower_text, frozenset(tokens), len(tokens))
+
+_INT8_EMBEDDING_SCALE = 127
+
+def _quantize_embeddings(matrix: np.ndarray) -> np.ndarray:
+    """Unit-normalize each row and scale it onto the int8 range"""
+    matrix = np.atleast_2d(np.asarray(matrix, dtype=np.float32))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    # Zero vectors stay zero instead of dividing by zero
+    matrix = np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+    return np.ascontiguousarray(np.rint(matrix * _INT8_EMBEDDING_SCALE), dtype=np.int8)
+
+class GeometricMeasurements(NamedTuple):
+    """Geometric measurements for a visual answer, read without dict lookups"""
+    scale_factor: float = 1.0
+    rotation_angle: float = 0.0
+    position_error: float = 0.0
+
 @dataclass
 class ConfidenceBreakdown:
     """Detailed breakdown of confidence scoring"""
@@ -27,11 +158,47 @@ class ConfidenceBreakdown:
     partial_credit_details: List[Dict]
     reasoning: str
 
+def _geometric_confidence(scale_factor: float,
+                                 rotation_angle: float,
+                                 position_error: float) -> float:
+    """Weighted geometric confidence from scale, rotation and position measurements"""
+    scale_confidence = max(0.0, 1.0 - abs(scale_factor - 1.0) / 0.2)  # 20% tolerance
+    rotation_confidence = max(0.0, 1.0 - abs(rotation_angle) / 10.0)  # 10° tolerance
+    position_confidence = max(0.0, 1.0 - position_error / 2.0)  # 2 grid units tolerance
+    
+    # Weight the factors: scale, rotation, position
+    geometric_confidence = (
+        scale_confidence * 0.3 +
+        rotation_confidence * 0.3 +
+        position_confidence * 0.4
+    )
+    
+    return min(1.0, geometric_confidence)
+
+def _weighted_average(scores: Sequence[float], weights: Sequence[float], total_weight: float) -> float:
+    """Weighted average of scores given the exactly rounded sum of weights"""
+    # Fuse normalization into the weighted sum instead of building a
+    # normalized weights list; fall back to equal weights if they sum to <= 0.
+    # zip() pairs scores and weights up to the shorter of the two
+    if total_weight > 0:
+        combined_confidence = math.fsum(s * w for s, w in zip(scores, weights)) / total_weight
+    else:
+        combined_confidence = math.fsum(scores[:len(weights)]) / len(weights)
+    
+    # Scalar result, so a min/max clamp is cheaper than np.clip
+    return min(1.0, max(0.0, combined_confidence))
+
+def _combine_confidence(scores: Sequence[float], weights: Sequence[float]) -> float:
+    """Weighted average of scores with weights normalized to sum to 1"""
+    return _weighted_average(scores, weights, math.fsum(weights))
+
 class ConfidenceScorer:
     """Main class for calculating confidence scores based on criteria matching"""
     
     def __init__(self):
         self.partial_credit_threshold = 0.6  # Minimum score for partial credit
+        self._weights = None  # (weights, total weight) default, see set_weights
+        self._int8_embeddings = None  # Quantized reference embeddings, see add_int8_embeddings
         
     def calculate_confidence_from_criteria(self, 
                                          student_answer: str,
@@ -43,34 +210,57 @@ class ConfidenceScorer:
         """
         
         matched_criteria = []
-        partial_credit_details = []
+        
+        # Partial credit is collected as parallel lists; scores are summed in
+        # bulk and the per-criterion dicts are only built for the result
+        partial_descriptions = []
+        partial_scores = []
+        partial_marks = []
+        partial_explanations = []
+        
+        # Convert to lowercase once for comparison against every criterion
+        answer_lower = student_answer.lower()
+        
+        # Count keyword hits for all criteria in a single scan when possible
+        keyword_counts = self._count_keyword_matches(answer_lower, mark_scheme)
         
         # Analyze each criterion
-        for criterion in mark_scheme:
+        for index, criterion in enumerate(mark_scheme):
             match_result = self._check_criterion_match(
-                student_answer, criterion, llm_feedback
+                answer_lower, criterion,
+                keyword_counts[index] if keyword_counts is not None else None
             )
             
             if match_result['fully_matched']:
                 matched_criteria.append(criterion)
             elif match_result['partially_matched']:
-                partial_credit_details.append({
-                    'criterion': criterion.description,
-                    'matched': True,
-                    'partial_score': match_result['partial_score'],
-                    'explanation': match_result['explanation']
-                })
+                partial_descriptions.append(criterion.description)
+                partial_scores.append(match_result['partial_score'])
+                partial_marks.append(match_result['partial_marks'])
+                partial_explanations.append(match_result['explanation'])
         
         # Calculate confidence score
         total_criteria = len(mark_scheme)
         criteria_matched = len(matched_criteria)
         
         # Add partial credit to the score
-        partial_credit_score = sum(detail['partial_score'] for detail in partial_credit_details)
+        partial_credit_score = math.fsum(partial_scores)
         total_score = criteria_matched + partial_credit_score
         
-        # Normalize to 0-1 range
-        confidence_score = min(1.0, total_score / total_criteria)
+        # Normalize to 0-1 range; each partial score is below 1, so this never exceeds 1
+        confidence_score = total_score / total_criteria
+        
+        partial_credit_details = [
+            {
+                'criterion': description,
+                'matched': True,
+                'partial_score': partial_score,
+                'partial_marks': marks,
+                'explanation': explanation
+            }
+            for description, partial_score, marks, explanation
+            in zip(partial_descriptions, partial_scores, partial_marks, partial_explanations)
+        ]
         
         # Generate reasoning
         reasoning = self._generate_confidence_reasoning(
@@ -85,25 +275,56 @@ class ConfidenceScorer:
             reasoning=reasoning
         )
     
-    def _check_criterion_match(self, 
-                              student_answer: str, 
-                              criterion: Criterion,
-                              llm_feedback: str) -> Dict:
-        """Check if a specific criterion is met by the student answer"""
+    def _count_keyword_matches(self, 
+                               answer_lower: str,
+                               mark_scheme: List[Criterion]) -> Optional[List[List[int]]]:
+        """
+        Count distinct whole-word keyword and partial credit keyword hits for every
+        criterion with one Aho-Corasick pass over the answer. Returns None when pyahocorasick
+        is not installed, in which case each criterion is scanned separately.
+        """
         
-        # Convert to lowercase for comparison
-        answer_lower = student_answer.lower()
-        feedback_lower = llm_feedback.lower()
+        if ahocorasick is None:
+            return None
         
-        # Check for exact keyword matches
-        keyword_matches = sum(1 for keyword in criterion.keywords 
-                            if keyword.lower() in answer_lower)
+        automaton, base_counts = _build_keyword_automaton(
+            tuple((c._keywords_lc, c._partial_keywords_lc) for c in mark_scheme)
+        )
+        counts = [list(c) for c in base_counts]
+        
+        if automaton is not None:
+            seen = set()
+            last = len(answer_lower) - 1
+            for end, (keyword, payload) in automaton.iter(answer_lower):
+                if keyword in seen:
+                    continue
+                # Only count whole-word occurrences, as _KeywordPattern does
+                start = end - len(keyword) + 1
+                if start > 0 and _is_word_char(answer_lower[start - 1]):
+                    continue
+                if end < last and _is_word_char(answer_lower[end + 1]):
+                    continue
+                seen.add(keyword)
+                for index, slot in payload:
+                    counts[index][slot] += 1
+        
+        return counts
+    
+    def _check_criterion_match(self, 
+                              answer_lower: str, 
+                              criterion: Criterion,
+                              keyword_counts: Optional[List[int]] = None) -> Dict:
+        """Check if a specific criterion is met by the (lowercased) student answer"""
         
-        # Check for partial credit keywords
-        partial_matches = 0
-        if criterion.partial_credit_keywords:
-            partial_matches = sum(1 for keyword in criterion.partial_credit_keywords 
-                                if keyword.lower() in answer_lower)
+        if keyword_counts is not None:
+            # Precomputed by _count_keyword_matches
+            keyword_matches, partial_matches = keyword_counts
+        else:
+            # Check for whole-word keyword matches
+            keyword_matches = criterion._keyword_pattern.count(answer_lower)
+            
+            # Check for partial credit keywords
+            partial_matches = criterion._partial_keyword_pattern.count(answer_lower)
         
         # Calculate match percentage
         total_keywords = len(criterion.keywords)
@@ -116,14 +337,17 @@ class ConfidenceScorer:
         partially_matched = (match_percentage >= self.partial_credit_threshold and 
                            not fully_matched)
         
-        # Calculate partial score
+        # Partial score stays in [0, 1] so it can be summed into the normalized
+        # confidence; the raw marks equivalent is reported separately
         partial_score = 0.0
+        partial_marks = 0.0
         if partially_matched:
-            partial_score = match_percentage * criterion.marks
+            partial_score = match_percentage
+            partial_marks = match_percentage * criterion.marks
         
         # Generate explanation
         explanation = self._generate_criterion_explanation(
-            criterion, keyword_matches, total_keywords, partial_matches
+            criterion, keyword_matches, total_keywords, partial_matches, answer_lower
         )
         
         return {
@@ -131,6 +355,7 @@ class ConfidenceScorer:
             'partially_matched': partially_matched,
             'match_percentage': match_percentage,
             'partial_score': partial_score,
+            'partial_marks': partial_marks,
             'explanation': explanation
         }
     
@@ -138,16 +363,18 @@ class ConfidenceScorer:
                                        criterion: Criterion,
                                        keyword_matches: int,
                                        total_keywords: int,
-                                       partial_matches: int) -> str:
+                                       partial_matches: int,
+                                       answer_lower: str) -> str:
         """Generate explanation for criterion matching"""
         
         if keyword_matches == total_keywords:
             return f"All required keywords found: {', '.join(criterion.keywords)}"
         elif keyword_matches > 0:
-            found_keywords = [kw for kw in criterion.keywords 
-                            if kw.lower() in criterion.description.lower()]
-            missing_keywords = [kw for kw in criterion.keywords 
-                              if kw.lower() not in criterion.description.lower()]
+            # Classify keywords against the student answer in a single pass
+            present = criterion._keyword_pattern.found(answer_lower)
+            found_keywords, missing_keywords = [], []
+            for keyword, keyword_lc in zip(criterion.keywords, criterion._keywords_lc):
+                (found_keywords if keyword_lc in present else missing_keywords).append(keyword)
             
             return (f"Found {keyword_matches}/{total_keywords} keywords. "
                    f"Found: {', '.join(found_keywords)}. "
@@ -176,37 +403,60 @@ class ConfidenceScorer:
             return (f"Low confidence: Only {criteria_matched}/{total_criteria} criteria met. "
                    f"High uncertainty; human review recommended.")
     
+    def prepare_expected(self, expected_answer: str) -> PreparedExpected:
+        """
+        Tokenize an expected answer once so it can be reused for every
+        student answer to the same question
+        """
+        return _prepare_expected(expected_answer)
+    
     def calculate_embedding_confidence(self, 
                                      student_answer: str,
-                                     expected_answer: str,
+                                     expected_answer: Union[str, PreparedExpected],
                                      embedding_similarity: float) -> float:
         """
         Calculate confidence based on semantic similarity between
         student answer and expected answer
         """
         
+        if isinstance(expected_answer, str):
+            expected_answer = self.prepare_expected(expected_answer)
+        
         # Normalize embedding similarity to 0-1 range
         # Assuming embedding_similarity is already in this range
         base_confidence = embedding_similarity
         
         # Apply additional factors that might affect confidence
         
+        # Lowercase and tokenize the student answer once; str.lower() is
+        # already ASCII-fast in CPython, so one pass is the cheap path
+        student_tokens = student_answer.lower().split()
+        
         # Length similarity factor
-        student_length = len(student_answer.split())
-        expected_length = len(expected_answer.split())
+        student_length = len(student_tokens)
+        expected_length = expected_answer.length
         
-        if expected_length > 0:
-            length_ratio = min(student_length / expected_length, expected_length / student_length)
-            length_factor = length_ratio * 0.2  # 20% weight for length
+        # Ratio of the shorter to the longer answer; an empty answer scores 0
+        if student_length <= expected_length:
+            shorter, longer = student_length, expected_length
         else:
-            length_factor = 0
+            shorter, longer = expected_length, student_length
+        length_ratio = shorter / longer if longer else 0.0
+        length_factor = length_ratio * 0.2  # 20% weight for length
         
         # Keyword presence factor
-        expected_words = set(expected_answer.lower().split())
-        student_words = set(student_answer.lower().split())
+        expected_words = expected_answer.words
+        student_words = frozenset(student_tokens)
         
         if expected_words:
-            keyword_overlap = len(expected_words.intersection(student_words)) / len(expected_words)
+            # Only the overlap size is needed: probe the larger set with the
+            # smaller one rather than allocating an intersection set
+            if len(expected_words) <= len(student_words):
+                small, large = expected_words, student_words
+            else:
+                small, large = student_words, expected_words
+            hits = sum(1 for word in small if word in large)
+            keyword_overlap = hits / len(expected_words)
             keyword_factor = keyword_overlap * 0.3  # 30% weight for keywords
         else:
             keyword_factor = 0
@@ -218,33 +468,60 @@ class ConfidenceScorer:
         
         return min(1.0, max(0.0, final_confidence))
     
+    def add_int8_embeddings(self, matrix: np.ndarray) -> None:
+        """
+        Store reference embeddings (e.g. one per mark scheme criterion) as
+        unit-normalized int8 rows, a quarter of the float32 size. Rows are
+        appended to any embeddings added before.
+        """
+        quantized = _quantize_embeddings(matrix)
+        if self._int8_embeddings is None:
+            self._int8_embeddings = quantized
+        else:
+            self._int8_embeddings = np.vstack([self._int8_embeddings, quantized])
+    
+    def embedding_similarities(self, query_embedding: np.ndarray) -> np.ndarray:
+        """
+        Approximate cosine similarity of query_embedding to every stored
+        embedding, usable as embedding_similarity in calculate_embedding_confidence
+        """
+        if self._int8_embeddings is None:
+            return np.zeros(0)
+        
+        query = _quantize_embeddings(query_embedding).ravel()
+        # NumPy has no int8 GEMM, so accumulate in int32 to avoid overflow
+        dots = self._int8_embeddings.astype(np.int32) @ query.astype(np.int32)
+        return dots / float(_INT8_EMBEDDING_SCALE * _INT8_EMBEDDING_SCALE)
+    
     def calculate_model_agreement_confidence(self, 
-                                           marking_results: List[Dict]) -> float:
+                                           marking_results: Union[List[Dict], np.ndarray]) -> float:
         """
         Calculate confidence based on agreement between multiple model runs
-        or different marking approaches
+        or different marking approaches. marking_results is a list of
+        {marks_awarded, total_marks} dicts or an (n_runs, 2) array of the same
         """
         
-        if not marking_results:
+        if len(marking_results) == 0:
             return 0.0
         
         # Extract marks from different runs
-        marks_list = [result.get('marks_awarded', 0) for result in marking_results]
-        total_marks_list = [result.get('total_marks', 1) for result in marking_results]
-        
-        # Calculate percentage scores
-        percentage_scores = []
-        for marks, total in zip(marks_list, total_marks_list):
-            if total > 0:
-                percentage_scores.append(marks / total)
-        
-        if not percentage_scores:
+        if isinstance(marking_results, np.ndarray):
+            runs = marking_results.astype(np.float64, copy=False).reshape(-1, 2)
+            marks, totals = runs[:, 0], runs[:, 1]
+        else:
+            marks = np.fromiter((result.get('marks_awarded', 0) for result in marking_results),
+                                dtype=np.float64, count=len(marking_results))
+            totals = np.fromiter((result.get('total_marks', 1) for result in marking_results),
+                                 dtype=np.float64, count=len(marking_results))
+        
+        # Calculate percentage scores, skipping runs without a positive total
+        valid = totals > 0
+        if not valid.any():
             return 0.0
+        percentage_scores = marks[valid] / totals[valid]
         
         # Calculate standard deviation of scores
-        mean_score = sum(percentage_scores) / len(percentage_scores)
-        variance = sum((score - mean_score) ** 2 for score in percentage_scores) / len(percentage_scores)
-        std_dev = math.sqrt(variance)
+        std_dev = float(percentage_scores.std())
         
         # Higher agreement (lower std dev) = higher confidence
         # Normalize to 0-1 range
@@ -252,8 +529,30 @@ class ConfidenceScorer:
         
         return min(1.0, agreement_confidence)
     
+    def calculate_model_agreement_confidence_batch(self, runs: np.ndarray) -> np.ndarray:
+        """
+        Agreement confidence for many papers at once. runs has shape
+        (n_papers, n_runs, 2) holding (marks_awarded, total_marks) per run;
+        returns an (n_papers,) array
+        """
+        runs = np.asarray(runs, dtype=np.float64)
+        marks, totals = runs[..., 0], runs[..., 1]
+        
+        # Same rules as the single-paper version: skip runs without a positive
+        # total, and papers with no valid runs score 0
+        valid = totals > 0
+        counts = valid.sum(axis=1)
+        percentage_scores = np.divide(marks, totals, out=np.zeros_like(marks), where=valid)
+        safe_counts = np.maximum(counts, 1)
+        means = percentage_scores.sum(axis=1) / safe_counts
+        deviations = np.where(valid, percentage_scores - means[:, None], 0.0)
+        std_dev = np.sqrt((deviations * deviations).sum(axis=1) / safe_counts)
+        
+        agreement_confidence = np.clip(1 - std_dev * 2, 0.0, 1.0)
+        return np.where(counts > 0, agreement_confidence, 0.0)
+    
     def calculate_geometric_confidence(self, 
-                                     geometric_accuracy: Dict) -> float:
+                                     geometric_accuracy: Union[Dict, GeometricMeasurements]) -> float:
         """
         Calculate confidence for visual/geometric questions based on
         measurable geometric properties
@@ -263,103 +562,50 @@ class ConfidenceScorer:
             return 0.0
         
         # Extract geometric measurements
-        scale_factor = geometric_accuracy.get('scale_factor', 1.0)
-        rotation_angle = geometric_accuracy.get('rotation_angle', 0.0)
-        position_error = geometric_accuracy.get('position_error', 0.0)
-        
-        # Calculate individual confidence scores
-        scale_confidence = max(0, 1 - abs(scale_factor - 1.0) / 0.2)  # 20% tolerance
-        rotation_confidence = max(0, 1 - abs(rotation_angle) / 10.0)  # 10° tolerance
-        position_confidence = max(0, 1 - position_error / 2.0)  # 2 grid units tolerance
-        
-        # Weight the factors
-        weights = [0.3, 0.3, 0.4]  # scale, rotation, position
-        
-        geometric_confidence = (
-            scale_confidence * weights[0] +
-            rotation_confidence * weights[1] +
-            position_confidence * weights[2]
-        )
+        if isinstance(geometric_accuracy, GeometricMeasurements):
+            scale_factor, rotation_angle, position_error = geometric_accuracy
+        else:
+            scale_factor = geometric_accuracy.get('scale_factor', 1.0)
+            rotation_angle = geometric_accuracy.get('rotation_angle', 0.0)
+            position_error = geometric_accuracy.get('position_error', 0.0)
         
-        return min(1.0, geometric_confidence)
+        return float(_geometric_confidence(
+            float(scale_factor), float(rotation_angle), float(position_error)
+        ))
+    
+    def set_weights(self, weights: Tuple[float, ...]) -> None:
+        """
+        Pack weights and their sum once for a batch; combine_confidence_scores
+        uses them whenever it is called without explicit weights
+        """
+        weights = np.asarray(weights, dtype=np.float64).ravel().tolist()
+        if not weights:
+            raise ValueError("weights must not be empty")
+        
+        # Same exactly rounded sum _combine_confidence computes, so results
+        # match passing weights= explicitly bit for bit
+        self._weights = (weights, math.fsum(weights))
     
     def combine_confidence_scores(self, 
-                                 confidence_scores: List[float],
-                                 weights: Optional[List[float]] = None) -> float:
+                                 confidence_scores: Union[List[float], np.ndarray],
+                                 weights: Optional[Union[List[float], np.ndarray]] = None) -> float:
         """
         Combine multiple confidence scores into a single weighted score
         """
         
-        if not confidence_scores:
+        if len(confidence_scores) == 0:
             return 0.0
         
-        if weights is None:
-            # Equal weights if none specified
-            weights = [1.0 / len(confidence_scores)] * len(confidence_scores)
+        # Python floats, so every product is a float64 product whatever the input dtype
+        scores = np.asarray(confidence_scores, dtype=np.float64).tolist()
         
-        # Ensure weights sum to 1
-        total_weight = sum(weights)
-        if total_weight > 0:
-            normalized_weights = [w / total_weight for w in weights]
-        else:
-            normalized_weights = [1.0 / len(weights)] * len(weights)
+        if weights is None and self._weights is not None:
+            # Weights were packed and summed once by set_weights
+            packed_weights, total_weight = self._weights
+            return _weighted_average(scores, packed_weights, total_weight)
         
-        # Calculate weighted average
-        combined_confidence = sum(score * weight 
-                                for score, weight in zip(confidence_scores, normalized_weights))
+        if weights is None:
+            # Equal weights if none specified
+            weights = [1.0 / len(scores)] * len(scores)
         
-        return min(1.0, max(0.0, combined_confidence))
-
-# Example usage
-if __name__ == "__main__":
-    # Example mark scheme criteria
-    mark_scheme = [
-        Criterion(
-            description="Correct method for solving quadratic equation",
-            marks=2,
-            keywords=["quadratic", "formula", "solve", "equation"],
-            partial_credit_keywords=["quadratic", "equation"]
-        ),
-        Criterion(
-            description="Correct substitution of values",
-            marks=1,
-            keywords=["substitute", "values", "correct"],
-            partial_credit_keywords=["substitute"]
-        ),
-        Criterion(
-            description="Correct final answer",
-            marks=1,
-            keywords=["answer", "correct", "result"],
-            partial_credit_keywords=["answer"]
-        )
-    ]
-    
-    # Example student answer
-    student_answer = "I used the quadratic formula to solve the equation and got x = 2"
-    
-    # Example LLM feedback
-    llm_feedback = "Student used correct method but made calculation error"
-    
-    # Initialize scorer
-    scorer = ConfidenceScorer()
-    
-    # Calculate confidence
-    confidence = scorer.calculate_confidence_from_criteria(
-        student_answer, mark_scheme, llm_feedback
-    )
-    
-    print(f"Confidence Score: {confidence.confidence_score:.3f}")
-    print(f"Criteria Met: {confidence.criteria_matched}/{confidence.total_criteria}")
-    print(f"Reasoning: {confidence.reasoning}")
-    
-    # Example of combining multiple confidence scores
-    criteria_confidence = confidence.confidence_score
-    embedding_confidence = 0.85
-    geometric_confidence = 0.92
-    
-    combined_confidence = scorer.combine_confidence_scores(
-        [criteria_confidence, embedding_confidence, geometric_confidence],
-        weights=[0.5, 0.3, 0.2]  # 50% criteria, 30% embedding, 20% geometric
-    )
-    
-    print(f"\nCombined Confidence: {combined_confidence:.3f}")
+        return _combine_confidence(scores, np.asarray(weights, dtype=np.float64).tolist())
@@ -0,0 +1,59 @@
+"""
+Example usage of the confidence scoring system
+Kept out of confidence_scorer.py so importing the scorer stays cheap
+"""
+
+from confidence_scorer import ConfidenceScorer, Criterion
+
+if __name__ == "__main__":
+    # Example mark scheme criteria
+    mark_scheme = [
+        Criterion(
+            description="Correct method for solving quadratic equation",
+            marks=2,
+            keywords=["quadratic", "formula", "solve", "equation"],
+            partial_credit_keywords=["quadratic", "equation"]
+        ),
+        Criterion(
+            description="Correct substitution of values",
+            marks=1,
+            keywords=["substitute", "values", "correct"],
+            partial_credit_keywords=["substitute"]
+        ),
+        Criterion(
+            description="Correct final answer",
+            marks=1,
+            keywords=["answer", "correct", "result"],
+            partial_credit_keywords=["answer"]
+        )
+    ]
+    
+    # Example student answer
+    student_answer = "I used the quadratic formula to solve the equation and got x = 2"
+    
+    # Example LLM feedback
+    llm_feedback = "Student used correct method but made calculation error"
+    
+    # Initialize scorer
+    scorer = ConfidenceScorer()
+    
+    # Calculate confidence
+    confidence = scorer.calculate_confidence_from_criteria(
+        student_answer, mark_scheme, llm_feedback
+    )
+    
+    print(f"Confidence Score: {confidence.confidence_score:.3f}")
+    print(f"Criteria Met: {confidence.criteria_matched}/{confidence.total_criteria}")
+    print(f"Reasoning: {confidence.reasoning}")
+    
+    # Example of combining multiple confidence scores
+    criteria_confidence = confidence.confidence_score
+    embedding_confidence = 0.85
+    geometric_confidence = 0.92
+    
+    combined_confidence = scorer.combine_confidence_scores(
+        [criteria_confidence, embedding_confidence, geometric_confidence],
+        weights=[0.5, 0.3, 0.2]  # 50% criteria, 30% embedding, 20% geometric
+    )
+    
+    print(f"\nCombined Confidence: {combined_confidence:.3f}")
@@ -2,27 +2,92 @@
 """
 Python Integration Script for Mark-It API
 This script provides a command-line interface for the confidence scorer and visual marking modules
+
+Run with --server to keep a single worker process alive: each stdin line is a
+JSON request {"mode": ..., "data": {...}} and each response is one JSON line on stdout.
 """
 
 import sys
 import json
+import math
+import hashlib
 import argparse
+from collections import OrderedDict
 from pathlib import Path
 
+try:
+    import orjson  # Optional: faster JSON parsing and serialization
+except ImportError:
+    orjson = None
+
 # Add the current directory to Python path
 sys.path.append(str(Path(__file__).parent))
 
-def run_confidence_scoring(args):
+# Prepared mark schemes keyed by a content hash, so repeated requests for the
+# same question (e.g. in --server mode) skip rebuilding Criterion objects
+_MARK_SCHEME_CACHE = OrderedDict()
+_MARK_SCHEME_CACHE_SIZE = 128
+
+# Expected shapes with vertices already packed for grading, keyed the same way
+_EXPECTED_SHAPE_CACHE = OrderedDict()
+_EXPECTED_SHAPE_CACHE_SIZE = 128
+
+def _content_key(data):
+    """Stable content hash of raw request JSON (a mark scheme or expected answer)"""
+    if orjson is not None:
+        canonical = orjson.dumps(data, option=orjson.OPT_SORT_KEYS)
+    else:
+        canonical = json.dumps(data, sort_keys=True).encode('utf-8')
+    return hashlib.blake2b(canonical, digest_size=16).digest()
+
+def load_mark_scheme(mark_scheme_data):
+    """Convert mark scheme data to Criterion objects, reusing cached conversions"""
+    from confidence_scorer import Criterion
+    
+    key = _content_key(mark_scheme_data)
+    mark_scheme = _MARK_SCHEME_CACHE.get(key)
+    if mark_scheme is not None:
+        _MARK_SCHEME_CACHE.move_to_end(key)
+        return mark_scheme
+    
+    mark_scheme = []
+    for criterion_data in mark_scheme_data:
+        criterion = Criterion(
+            description=criterion_data.get('description', ''),
+            marks=criterion_data.get('marks', 1),
+            keywords=criterion_data.get('keywords', []),
+            partial_credit_keywords=criterion_data.get('partial_credit_keywords', []),
+            tolerance=criterion_data.get('tolerance', 0.1)
+        )
+        mark_scheme.append(criterion)
+    
+    _MARK_SCHEME_CACHE[key] = mark_scheme
+    if len(_MARK_SCHEME_CACHE) > _MARK_SCHEME_CACHE_SIZE:
+        _MARK_SCHEME_CACHE.popitem(last=False)
+    
+    return mark_scheme
+
+def load_expected_shape(marker, expected_answer):
+    """Prepare an expected answer for grading once, reusing cached preparations"""
+    key = _content_key(expected_answer)
+    expected_shape = _EXPECTED_SHAPE_CACHE.get(key)
+    if expected_shape is not None:
+        _EXPECTED_SHAPE_CACHE.move_to_end(key)
+        return expected_shape
+    
+    expected_shape = marker.prepare_expected_shape(expected_answer)
+    
+    _EXPECTED_SHAPE_CACHE[key] = expected_shape
+    if len(_EXPECTED_SHAPE_CACHE) > _EXPECTED_SHAPE_CACHE_SIZE:
+        _EXPECTED_SHAPE_CACHE.popitem(last=False)
+    
+    return expected_shape
+
+def run_confidence_scoring(data):
     """Run confidence scoring analysis"""
     try:
         # Lazy imports to avoid unnecessary hard dependencies (e.g., cv2)
-        from confidence_scorer import ConfidenceScorer, Criterion
-        # Parse input data
-        if args.input_file:
-            with open(args.input_file, 'r') as f:
-                data = json.load(f)
-        else:
-            data = json.loads(args.input_data)
+        from confidence_scorer import ConfidenceScorer
         
         # Extract parameters
         student_answer = data.get('student_answer', '')
@@ -30,16 +95,7 @@ def run_confidence_scoring(args):
         llm_feedback = data.get('llm_feedback', '')
         
         # Convert mark scheme data to Criterion objects
-        mark_scheme = []
-        for criterion_data in mark_scheme_data:
-            criterion = Criterion(
-                description=criterion_data.get('description', ''),
-                marks=criterion_data.get('marks', 1),
-                keywords=criterion_data.get('keywords', []),
-                partial_credit_keywords=criterion_data.get('partial_credit_keywords', []),
-                tolerance=criterion_data.get('tolerance', 0.1)
-            )
-            mark_scheme.append(criterion)
+        mark_scheme = load_mark_scheme(mark_scheme_data)
         
         # Initialize confidence scorer
         scorer = ConfidenceScorer()
@@ -50,7 +106,7 @@ def run_confidence_scoring(args):
         )
         
         # Prepare output
-        output = {
+        return {
             'confidence_score': confidence_result.confidence_score,
             'criteria_matched': confidence_result.criteria_matched,
             'total_criteria': confidence_result.total_criteria,
@@ -58,11 +114,9 @@ def run_confidence_scoring(args):
             'reasoning': confidence_result.reasoning,
             'success': True
         }
-        
-        print(json.dumps(output, indent=2))
-        
+    
     except Exception as e:
-        error_output = {
+        return {
             'success': False,
             'error': str(e),
             'confidence_score': 0.5,
@@ -71,19 +125,12 @@ def run_confidence_scoring(args):
             'partial_credit_details': [],
             'reasoning': f'Error occurred: {str(e)}'
         }
-        print(json.dumps(error_output, indent=2))
 
-def run_visual_marking(args):
+def run_visual_marking(data):
     """Run visual marking analysis"""
     try:
         # Import only when visual mode is requested to avoid cv2 requirement for other modes
         from visual_marking import VisualMarker
-        # Parse input data
-        if args.input_file:
-            with open(args.input_file, 'r') as f:
-                data = json.load(f)
-        else:
-            data = json.loads(args.input_data)
         
         # Extract parameters
         image_path = data.get('image_path', '')
@@ -93,22 +140,21 @@ def run_visual_marking(args):
         # Initialize visual marker
         marker = VisualMarker(grid_spacing=grid_spacing)
         
-        # Mark visual question
-        result = marker.mark_visual_question(image_path, expected_answer)
+        # Mark visual question against the prepared (cached) expected shape
+        expected_shape = load_expected_shape(marker, expected_answer)
+        result = marker.mark_visual_question(image_path, expected_shape)
         
         # Prepare output
-        output = {
+        return {
             'success': True,
             'confidence': result['confidence'],
             'feedback': result['feedback'],
             'geometric_accuracy': result.get('geometric_accuracy'),
             'detected_shapes': result.get('detected_shapes', [])
         }
-        
-        print(json.dumps(output, indent=2))
-        
+    
     except Exception as e:
-        error_output = {
+        return {
             'success': False,
             'error': str(e),
             'confidence': 0.0,
@@ -116,19 +162,12 @@ def run_visual_marking(args):
             'geometric_accuracy': None,
             'detected_shapes': []
         }
-        print(json.dumps(error_output, indent=2))
 
-def run_agreement_confidence(args):
+def run_agreement_confidence(data):
     """Run model agreement confidence calculation"""
     try:
         # Lazy import to avoid importing visual dependencies
         from confidence_scorer import ConfidenceScorer
-        # Parse input data
-        if args.input_file:
-            with open(args.input_file, 'r') as f:
-                data = json.load(f)
-        else:
-            data = json.loads(args.input_data)
 
         # Expect a list of { marks_awarded, total_marks }
         marking_results = data.get('marking_results', [])
@@ -136,54 +175,144 @@ def run_agreement_confidence(args):
         scorer = ConfidenceScorer()
         confidence = scorer.calculate_model_agreement_confidence(marking_results)
 
-        output = {
+        return {
             'success': True,
             'confidence_score': confidence
         }
 
-        print(json.dumps(output, indent=2))
-
     except Exception as e:
-        error_output = {
+        return {
             'success': False,
             'error': str(e),
             'confidence_score': 0.0
         }
-        print(json.dumps(error_output, indent=2))
+
+MODES = {
+    'confidence': run_confidence_scoring,
+    'visual': run_visual_marking,
+    'agreement': run_agreement_confidence,
+}
+
+def json_loads(data):
+    """Parse JSON from str or bytes, using orjson when available"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _json_safe(obj):
+    """
+    Convert numpy values to Python types and non-finite floats to None, so both
+    JSON backends produce the same bytes and the output is valid for JSON.parse
+    """
+    if isinstance(obj, dict):
+        return {key: _json_safe(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_json_safe(value) for value in obj]
+    if isinstance(obj, float):
+        return float(obj) if math.isfinite(obj) else None
+    if hasattr(obj, 'tolist'):  # numpy scalars and arrays
+        return _json_safe(obj.tolist())
+    return obj
+
+def json_dumps(obj, indent=False):
+    """Serialize obj to UTF-8 JSON bytes, using orjson when available"""
+    obj = _json_safe(obj)
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    if indent:
+        return json.dumps(obj, indent=2, allow_nan=False).encode('utf-8')
+    return json.dumps(obj, separators=(',', ':'), allow_nan=False).encode('utf-8')
+
+def write_output(obj, stream=None, pretty=False):
+    """Write obj as compact (or indented, if pretty) JSON followed by a newline"""
+    stream = stream or sys.stdout.buffer
+    stream.write(json_dumps(obj, indent=pretty) + b'\n')
+    stream.flush()
+
+def load_input(args):
+    """Parse input data from --input-file or --input-data"""
+    if args.input_file:
+        with open(args.input_file, 'rb') as f:
+            return json_loads(f.read())
+    return json_loads(args.input_data.encode())
+
+def handle_request(request):
+    """Dispatch a single {mode, data} request to the matching run_* function"""
+    mode = request.get('mode')
+    handler = MODES.get(mode)
+    if handler is None:
+        return {
+            'success': False,
+            'error': f'Unknown mode: {mode}'
+        }
+    return handler(request.get('data', {}))
+
+def serve(stdin=None, stdout=None):
+    """Persistent worker loop: one JSON request per input line, one JSON response per output line"""
+    stdin = stdin or sys.stdin.buffer
+    stdout = stdout or sys.stdout.buffer
+    for line in stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            result = handle_request(json_loads(line))
+        except Exception as e:
+            result = {
+                'success': False,
+                'error': f'Invalid request: {str(e)}'
+            }
+        stdout.write(json_dumps(result) + b'\n')
+        stdout.flush()
 
 def main():
     """Main entry point"""
     parser = argparse.ArgumentParser(description='Mark-It Python Integration Script')
-    parser.add_argument('--mode', choices=['confidence', 'visual', 'agreement'], required=True,
+    parser.add_argument('--mode', choices=sorted(MODES),
                        help='Mode to run: confidence scoring or visual marking')
     parser.add_argument('--input-file', help='Path to input JSON file')
     parser.add_argument('--input-data', help='Input JSON data as string')
     parser.add_argument('--output-file', help='Path to output JSON file')
+    parser.add_argument('--server', action='store_true',
+                       help='Run as a persistent worker reading JSON requests from stdin')
+    parser.add_argument('--pretty', action='store_true',
+                       help='Indent JSON output for debugging')
     
     args = parser.parse_args()
     
+    if args.server:
+        serve()
+        return
+    
+    if not args.mode:
+        parser.error('--mode is required unless --server is given')
+    
     # Validate input
     if not args.input_file and not args.input_data:
-        print(json.dumps({
+        write_output({
             'success': False,
             'error': 'Either --input-file or --input-data must be provided'
-        }, indent=2))
+        }, pretty=args.pretty)
+        sys.exit(1)
+    
+    try:
+        data = load_input(args)
+    except Exception as e:
+        write_output({
+            'success': False,
+            'error': f'Invalid input: {str(e)}'
+        }, pretty=args.pretty)
         sys.exit(1)
     
     # Run appropriate mode
-    if args.mode == 'confidence':
-        run_confidence_scoring(args)
-    elif args.mode == 'visual':
-        run_visual_marking(args)
-    elif args.mode == 'agreement':
-        run_agreement_confidence(args)
+    output = MODES[args.mode](data)
     
     # Redirect output to file if specified
     if args.output_file:
-        with open(args.output_file, 'w') as f:
-            f.write(sys.stdout.getvalue())
+        with open(args.output_file, 'wb') as f:
+            write_output(output, f, pretty=args.pretty)
+    else:
+        write_output(output, pretty=args.pretty)
 
 if __name__ == '__main__':
     main()
-
-
@@ -60,6 +60,7 @@ export const markResultSchema = z.object({
 								criterion: z.string(),
 								matched: z.boolean(),
 								partial_score: z.number(),
+								partial_marks: z.number().optional(),
 								explanation: z.string(),
 							})
 						)
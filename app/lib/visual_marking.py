@@ -3,18 +3,30 @@ Visual Marking Module for Graph Paper Questions
 Handles detection and grading of geometric shapes drawn on graph paper
 """
 
+import os
 import cv2
 import numpy as np
 import math
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Tuple, Dict, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 import json
 
+try:
+    from numba import njit  # Optional: JIT-compile the per-shape geometry kernels
+except ImportError:
+    def njit(*args, **kwargs):
+        """Fallback when numba is not installed: run kernels as plain Python"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
 @dataclass
 class DetectedShape:
     """Represents a detected geometric shape from an image"""
     shape_type: str
-    vertices: List[Tuple[float, float]]
+    vertices: np.ndarray  # (N, 2) float32 pixel coordinates
     confidence: float
     bounding_box: Tuple[int, int, int, int]
 
@@ -26,15 +38,143 @@ class GeometricAccuracy:
     position_error: float
     overall_accuracy: float
 
+# Detected shapes keyed by image path, mtime, size and detection settings, so
+# re-marking one scanned page against several expected answers skips OpenCV
+_DETECTION_CACHE = OrderedDict()
+_DETECTION_CACHE_SIZE = 64
+
+# Longest side, in pixels, that preprocess_image downscales larger images to
+_DETECTION_MAX_DIMENSION = 1024.0
+
+# Minimum number of candidate contours before detect_shapes uses a thread pool
+_PARALLEL_CONTOUR_THRESHOLD = 256
+
+@njit('boolean(float32[:, :])', cache=True)
+def _rectangle_kernel(points: np.ndarray) -> bool:
+    """True if every corner of a (4, 2) float32 quadrilateral is within 15° of a right angle"""
+    for i in range(4):
+        cx = points[(i + 1) % 4, 0]
+        cy = points[(i + 1) % 4, 1]
+        v1x = points[i, 0] - cx
+        v1y = points[i, 1] - cy
+        v2x = points[(i + 2) % 4, 0] - cx
+        v2y = points[(i + 2) % 4, 1] - cy
+        
+        norms = math.sqrt(v1x * v1x + v1y * v1y) * math.sqrt(v2x * v2x + v2y * v2y)
+        if norms == 0:
+            return False
+        cos_angle = min(1.0, max(-1.0, (v1x * v2x + v1y * v2y) / norms))
+        if abs(math.degrees(math.acos(cos_angle)) - 90) >= 15:
+            return False
+    return True
+
+@njit('float64(float32[:, :])', cache=True)
+def _circularity_kernel(points: np.ndarray) -> float:
+    """Ratio of polygon area to the area of a circle with the same perimeter"""
+    n = points.shape[0]
+    area = 0.0
+    perimeter = 0.0
+    for i in range(n):
+        x1 = points[i, 0]
+        y1 = points[i, 1]
+        x2 = points[(i + 1) % n, 0]
+        y2 = points[(i + 1) % n, 1]
+        area += x1 * y2 - x2 * y1
+        perimeter += math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
+    area = abs(area) / 2
+    
+    # For a circle, area = π * (perimeter/(2π))²
+    expected_area = math.pi * (perimeter / (2 * math.pi)) ** 2
+    return area / expected_area if expected_area > 0 else 0.0
+
+@njit(cache=True)
+def _overall_accuracy_kernel(scale_factor: float,
+                             rotation_angle: float,
+                             position_error: float,
+                             scale_tolerance: float,
+                             rotation_tolerance: float,
+                             position_tolerance: float) -> float:
+    """Weighted accuracy score from geometric measurements and their tolerances"""
+    scale_score = max(0.0, 1 - abs(scale_factor - 1.0) / scale_tolerance)
+    rotation_score = max(0.0, 1 - abs(rotation_angle) / rotation_tolerance)
+    position_score = max(0.0, 1 - position_error / position_tolerance)
+    
+    # Weight the scores: scale, rotation, position
+    overall_score = (
+        scale_score * 0.3 +
+        rotation_score * 0.3 +
+        position_score * 0.4
+    )
+    
+    return max(0.0, min(1.0, overall_score))
+
+@njit(cache=True)
+def _mean_edge_length(vertices: np.ndarray) -> float:
+    """Mean length of the non-degenerate edges between consecutive vertices (nan if none)"""
+    total = 0.0
+    count = 0
+    for i in range(vertices.shape[0] - 1):
+        length = math.hypot(vertices[i + 1, 0] - vertices[i, 0],
+                            vertices[i + 1, 1] - vertices[i, 1])
+        if length > 0:
+            total += length
+            count += 1
+    return total / count if count else np.nan
+
+@njit(cache=True)
+def _scale_factor_kernel(detected: np.ndarray, expected: np.ndarray) -> float:
+    """Ratio of mean detected edge length to mean expected edge length"""
+    avg_expected = _mean_edge_length(expected)
+    if np.isnan(avg_expected):
+        return 1.0
+    return _mean_edge_length(detected) / avg_expected
+
+@njit(cache=True)
+def _rotation_angle_kernel(detected: np.ndarray, expected: np.ndarray) -> float:
+    """Mean absolute angle, in degrees, between first-vertex vectors of both shapes"""
+    n = min(detected.shape[0], expected.shape[0])
+    total = 0.0
+    count = 0
+    for i in range(1, n):
+        dx = detected[i, 0] - detected[0, 0]
+        dy = detected[i, 1] - detected[0, 1]
+        ex = expected[i, 0] - expected[0, 0]
+        ey = expected[i, 1] - expected[0, 1]
+        # Ignore pairs where either vector is zero
+        if (dx == 0 and dy == 0) or (ex == 0 and ey == 0):
+            continue
+        # Signed angle difference, wrapped to [-pi, pi]
+        angle = math.atan2(dy, dx) - math.atan2(ey, ex)
+        total += abs(math.atan2(math.sin(angle), math.cos(angle)))
+        count += 1
+    return math.degrees(total / count) if count else 0.0
+
+@njit(cache=True)
+def _position_error_kernel(detected: np.ndarray, expected: np.ndarray) -> float:
+    """Mean distance between corresponding vertices of equal-length arrays"""
+    total = 0.0
+    for i in range(detected.shape[0]):
+        total += math.hypot(detected[i, 0] - expected[i, 0], detected[i, 1] - expected[i, 1])
+    return total / detected.shape[0]
+
 class VisualMarker:
     """Main class for visual question marking"""
     
-    def __init__(self, grid_spacing: float = 1.0, tolerance: float = 0.1):
+    def __init__(self, grid_spacing: float = 1.0, tolerance: float = 0.1,
+                 min_contour_area: float = 100.0):
         self.grid_spacing = grid_spacing
         self.tolerance = tolerance
-        
-    def preprocess_image(self, image_path: str) -> np.ndarray:
-        """Preprocess image for better shape detection"""
+        # Contours smaller than this (in pixels²) are treated as noise
+        self.min_contour_area = min_contour_area
+        # Reused for every image rather than rebuilt per call
+        self._clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        self._close_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2))
+        
+    def preprocess_image(self, image_path: str) -> Tuple[np.ndarray, float]:
+        """
+        Preprocess image for better shape detection; returns the binary image and
+        the resize factor applied to it, to pass on to detect_shapes
+        """
         # Load image
         img = cv2.imread(image_path)
         if img is None:
@@ -46,86 +186,176 @@ class VisualMarker:
         # Deskew image by detecting grid lines
         gray = self._deskew_image(gray)
         
-        # Enhance contrast
-        gray = cv2.equalizeHist(gray)
+        # Shrink large scans; detection needs far fewer pixels than a full page has
+        scale = min(1.0, _DETECTION_MAX_DIMENSION / max(gray.shape))
+        
+        # Run the full-image filters through the Transparent API when OpenCL is
+        # available: one upload here, one download before findContours
+        if cv2.ocl.useOpenCL():
+            gray = cv2.UMat(gray)
         
-        # Apply threshold to get binary image
-        _, binary = cv2.threshold(gray, 200, 255, cv2.THRESH_BINARY_INV)
+        if scale < 1.0:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        
+        # Enhance contrast locally so uneven scan lighting doesn't wash out strokes
+        gray = self._clahe.apply(gray)
+        
+        # Apply adaptive threshold to get binary image with fewer spurious pixels
+        binary = cv2.adaptiveThreshold(
+            gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 31, 10
+        )
         
         # Remove noise
-        kernel = np.ones((2, 2), np.uint8)
-        binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
+        binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, self._close_kernel)
+        
+        if isinstance(binary, cv2.UMat):
+            binary = binary.get()
         
-        return binary
+        return binary, scale
     
     def _deskew_image(self, gray: np.ndarray) -> np.ndarray:
         """Deskew image by detecting and aligning with grid lines"""
-        # Detect edges
-        edges = cv2.Canny(gray, 50, 150, apertureSize=3)
-        
-        # Detect lines using Hough transform
-        lines = cv2.HoughLines(edges, 1, np.pi/180, 200)
-        
-        if lines is not None:
-            # Find dominant horizontal and vertical lines
-            horizontal_angles = []
-            vertical_angles = []
+        # Detect edges on a half-resolution copy; the skew angle is scale-invariant
+        small = cv2.resize(gray, None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA)
+        edges = cv2.Canny(small, 50, 150, apertureSize=3)
+        
+        # Detect line segments using the probabilistic Hough transform
+        segments = cv2.HoughLinesP(edges, 1, np.pi/180, 100,
+                                   minLineLength=small.shape[1] // 4, maxLineGap=20)
+        
+        if segments is not None:
+            # Angle of each segment from the horizontal, in degrees
+            x1, y1, x2, y2 = segments.reshape(-1, 4).astype(np.float64).T
+            angles = np.degrees(np.arctan2(y2 - y1, x2 - x1))
+            # Fold direction so segments drawn right-to-left count the same
+            angles = (angles + 90) % 180 - 90
             
-            for line in lines:
-                rho, theta = line[0]
-                angle = theta * 180 / np.pi
-                
-                if abs(angle) < 10 or abs(angle - 90) < 10:
-                    if abs(angle) < 10:
-                        horizontal_angles.append(angle)
-                    else:
-                        vertical_angles.append(angle)
-            
-            # Calculate average skew
-            if horizontal_angles:
-                avg_skew = np.mean(horizontal_angles)
-                # Apply rotation correction
+            # Calculate average skew of the near-horizontal grid lines
+            horizontal_angles = angles[np.abs(angles) < 10]
+            if horizontal_angles.size:
+                avg_skew = float(horizontal_angles.mean())
+                # Apply rotation correction at full resolution
                 height, width = gray.shape
                 center = (width // 2, height // 2)
-                rotation_matrix = cv2.getRotationMatrix2D(center, -avg_skew, 1.0)
+                rotation_matrix = cv2.getRotationMatrix2D(center, avg_skew, 1.0)
                 gray = cv2.warpAffine(gray, rotation_matrix, (width, height))
         
         return gray
     
-    def detect_shapes(self, binary_image: np.ndarray) -> List[DetectedShape]:
-        """Detect geometric shapes in the binary image"""
-        shapes = []
-        
+    def detect_shapes(self, binary_image: np.ndarray, scale: float = 1.0) -> List[DetectedShape]:
+        """
+        Detect geometric shapes in the binary image; scale is the resize factor
+        preprocess_image applied, and results are returned in original pixels
+        """
         # Find contours
         contours, _ = cv2.findContours(binary_image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         
-        for contour in contours:
-            # Approximate contour to reduce noise
-            epsilon = 0.02 * cv2.arcLength(contour, True)
-            approx = cv2.approxPolyDP(contour, epsilon, True)
-            
-            # Determine shape type based on number of vertices
-            if len(approx) >= 3:
-                shape_type = self._classify_shape(approx)
-                vertices = [(point[0][0], point[0][1]) for point in approx]
-                
-                # Calculate confidence based on contour quality
-                confidence = self._calculate_shape_confidence(contour, approx)
-                
-                # Get bounding box
-                x, y, w, h = cv2.boundingRect(contour)
-                bounding_box = (x, y, w, h)
-                
-                shape = DetectedShape(
-                    shape_type=shape_type,
-                    vertices=vertices,
-                    confidence=confidence,
-                    bounding_box=bounding_box
-                )
-                shapes.append(shape)
+        # Measure every contour once and drop noise specks with a single mask;
+        # min_contour_area is in original pixels, so scale it to the binary image
+        areas = np.fromiter((cv2.contourArea(c) for c in contours),
+                            dtype=np.float64, count=len(contours))
+        keep = np.flatnonzero(areas >= self.min_contour_area * scale * scale)
+        
+        # Decimate the surviving contours at sub-pixel tolerance so every later
+        # O(N) measurement and the main approximation run on fewer points
+        simplified = [cv2.approxPolyDP(contours[i], 0.5, True) for i in keep]
+        perimeters = np.fromiter((cv2.arcLength(c, True) for c in simplified),
+                                 dtype=np.float64, count=len(simplified))
+        
+        jobs = [(contour, float(areas[i]), float(perimeter))
+                for contour, i, perimeter in zip(simplified, keep, perimeters)]
+        
+        # Per-contour work is a few GIL-releasing OpenCV calls, so threads only
+        # pay for their startup cost on noisy scans with many candidate contours.
+        # Each worker takes one contiguous chunk to keep per-task overhead low.
+        workers = os.cpu_count() or 1
+        if workers > 1 and len(jobs) >= _PARALLEL_CONTOUR_THRESHOLD:
+            chunk_size = -(-len(jobs) // workers)
+            chunks = [jobs[k:k + chunk_size] for k in range(0, len(jobs), chunk_size)]
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = [shape
+                           for chunk_shapes in executor.map(self._process_contours, chunks)
+                           for shape in chunk_shapes]
+        else:
+            results = self._process_contours(jobs)
+        
+        # Map coordinates back to the original image resolution
+        if scale != 1.0:
+            for shape in results:
+                shape.vertices /= scale
+                x, y, w, h = shape.bounding_box
+                shape.bounding_box = (int(round(x / scale)), int(round(y / scale)),
+                                      int(round(w / scale)), int(round(h / scale)))
         
+        return results
+    
+    def _process_contours(self, jobs: List[Tuple[np.ndarray, float, float]]) -> List[DetectedShape]:
+        """Process (contour, area, perimeter) jobs in order, dropping non-polygons"""
+        shapes = []
+        for contour, area, perimeter in jobs:
+            shape = self._process_contour(contour, area, perimeter)
+            if shape is not None:
+                shapes.append(shape)
         return shapes
     
+    def _process_contour(self,
+                         contour: np.ndarray,
+                         area: float,
+                         perimeter: float) -> Optional[DetectedShape]:
+        """Approximate and classify a single contour, or return None if it is not a polygon"""
+        # Approximate contour to reduce noise
+        epsilon = 0.02 * perimeter
+        approx = cv2.approxPolyDP(contour, epsilon, True)
+        
+        # Determine shape type based on number of vertices
+        if len(approx) < 3:
+            return None
+        
+        shape_type = self._classify_shape(approx)
+        vertices = np.ascontiguousarray(approx.reshape(-1, 2), dtype=np.float32)
+        
+        # Calculate confidence based on contour quality
+        confidence = self._calculate_shape_confidence(approx, area)
+        
+        # Get bounding box
+        x, y, w, h = cv2.boundingRect(contour)
+        bounding_box = (x, y, w, h)
+        
+        return DetectedShape(
+            shape_type=shape_type,
+            vertices=vertices,
+            confidence=confidence,
+            bounding_box=bounding_box
+        )
+    
+    def _detect_cached(self, image_path: str) -> List[DetectedShape]:
+        """Preprocess and detect shapes, reusing results for an unchanged image file"""
+        try:
+            stat = os.stat(image_path)
+        except OSError:
+            # Let preprocess_image report the unreadable image
+            return self.detect_shapes(*self.preprocess_image(image_path))
+        
+        key = (os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size,
+               self.min_contour_area)
+        shapes = _DETECTION_CACHE.get(key)
+        if shapes is not None:
+            _DETECTION_CACHE.move_to_end(key)
+            return [replace(shape) for shape in shapes]
+        
+        binary_image, scale = self.preprocess_image(image_path)
+        shapes = tuple(self.detect_shapes(binary_image, scale))
+        # Callers get their own DetectedShape objects; the vertex arrays are
+        # shared with the cache, so freeze them rather than copying on every hit
+        for shape in shapes:
+            shape.vertices.setflags(write=False)
+        
+        _DETECTION_CACHE[key] = shapes
+        if len(_DETECTION_CACHE) > _DETECTION_CACHE_SIZE:
+            _DETECTION_CACHE.popitem(last=False)
+        
+        return [replace(shape) for shape in shapes]
+    
     def _classify_shape(self, approx: np.ndarray) -> str:
         """Classify shape based on number of vertices and properties"""
         num_vertices = len(approx)
@@ -156,57 +386,40 @@ class VisualMarker:
         if len(approx) != 4:
             return False
         
-        # Calculate angles between adjacent edges
-        angles = []
-        for i in range(4):
-            p1 = approx[i][0]
-            p2 = approx[(i + 1) % 4][0]
-            p3 = approx[(i + 2) % 4][0]
-            
-            v1 = p1 - p2
-            v2 = p3 - p2
-            
-            cos_angle = np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2))
-            angle = np.arccos(np.clip(cos_angle, -1, 1))
-            angles.append(angle * 180 / np.pi)
-        
-        # Check if angles are approximately 90 degrees
-        return all(abs(angle - 90) < 15 for angle in angles)
+        # Check if angles between adjacent edges are approximately 90 degrees
+        return bool(_rectangle_kernel(approx.reshape(4, 2).astype(np.float32)))
     
     def _is_circle(self, approx: np.ndarray) -> bool:
         """Check if polygon is approximately circular"""
         if len(approx) < 6:
             return False
         
-        # Calculate area and perimeter
-        area = cv2.contourArea(approx)
-        perimeter = cv2.arcLength(approx, True)
-        
-        # For a circle, area = π * (perimeter/(2π))²
-        expected_area = math.pi * (perimeter / (2 * math.pi)) ** 2
-        
-        # Check if actual area is close to expected circular area
-        circularity = area / expected_area if expected_area > 0 else 0
+        # Check if actual area is close to the area of a circle with the same perimeter
+        circularity = _circularity_kernel(approx.reshape(-1, 2).astype(np.float32))
         return circularity > 0.7
     
-    def _calculate_shape_confidence(self, contour: np.ndarray, approx: np.ndarray) -> float:
-        """Calculate confidence score for detected shape"""
-        # Compare original contour with approximation
-        approx_contour = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
-        
-        # Calculate similarity between original and approximated contour
-        similarity = cv2.matchShapes(contour, approx_contour, cv2.CONTOURS_MATCH_I2, 0)
-        
-        # Convert similarity to confidence (lower similarity = higher confidence)
-        confidence = max(0, 1 - similarity)
-        
-        # Additional factors
-        area = cv2.contourArea(contour)
-        if area < 100:  # Very small shapes get lower confidence
-            confidence *= 0.8
+    def _calculate_shape_confidence(self, approx: np.ndarray, area: float) -> float:
+        """Calculate confidence score for detected shape given its contour area"""
+        # Compare the area of the approximated polygon with the original contour;
+        # a faithful approximation keeps the ratio close to 1. Very small shapes
+        # never get here: detect_shapes drops them below min_contour_area
+        area_ratio = cv2.contourArea(approx) / max(area, 1e-6)
+        confidence = max(0.0, 1.0 - abs(1.0 - area_ratio))
         
         return min(1.0, confidence)
     
+    def prepare_expected_shape(self, expected_shape: Dict) -> Dict:
+        """
+        Copy of expected_shape with vertices packed once into a contiguous (N, 2)
+        float32 array, for grading many students against the same question; the
+        array is read-only so a shared prepared shape cannot be altered
+        """
+        prepared = dict(expected_shape)
+        vertices = np.array(expected_shape.get('vertices', []), dtype=np.float32).reshape(-1, 2)
+        vertices.setflags(write=False)
+        prepared['vertices'] = vertices
+        return prepared
+    
     def grade_geometric_accuracy(self, 
                                 detected_shape: DetectedShape,
                                 expected_shape: Dict) -> GeometricAccuracy:
@@ -225,7 +438,7 @@ class VisualMarker:
         grid_vertices = self._pixels_to_grid(detected_shape.vertices)
         expected_vertices = expected_shape.get('vertices', [])
         
-        if not expected_vertices or len(grid_vertices) != len(expected_vertices):
+        if len(expected_vertices) == 0 or len(grid_vertices) != len(expected_vertices):
             return GeometricAccuracy(
                 scale_factor=0.0,
                 rotation_angle=0.0,
@@ -233,14 +446,18 @@ class VisualMarker:
                 overall_accuracy=0.0
             )
         
+        # Pack expected vertices into an (N, 2) array for the measurement kernels;
+        # no copy if prepare_expected_shape already did this
+        expected_array = np.asarray(expected_vertices, dtype=np.float32)
+        
         # Calculate scale factor
-        scale_factor = self._calculate_scale_factor(grid_vertices, expected_vertices)
+        scale_factor = self._calculate_scale_factor(grid_vertices, expected_array)
         
         # Calculate rotation angle
-        rotation_angle = self._calculate_rotation_angle(grid_vertices, expected_vertices)
+        rotation_angle = self._calculate_rotation_angle(grid_vertices, expected_array)
         
         # Calculate position error
-        position_error = self._calculate_position_error(grid_vertices, expected_vertices)
+        position_error = self._calculate_position_error(grid_vertices, expected_array)
         
         # Calculate overall accuracy
         overall_accuracy = self._calculate_overall_accuracy(
@@ -254,78 +471,40 @@ class VisualMarker:
             overall_accuracy=overall_accuracy
         )
     
-    def _pixels_to_grid(self, vertices: List[Tuple[float, float]]) -> List[Tuple[float, float]]:
-        """Convert pixel coordinates to grid coordinates"""
+    def _pixels_to_grid(self, vertices: np.ndarray) -> np.ndarray:
+        """Convert (N, 2) pixel coordinates to float32 grid coordinates"""
         # This is a simplified conversion - in practice you'd need to calibrate
         # the grid spacing based on the actual image
-        return [(x / self.grid_spacing, y / self.grid_spacing) for x, y in vertices]
+        return np.asarray(vertices, dtype=np.float32).reshape(-1, 2) / np.float32(self.grid_spacing)
     
     def _calculate_scale_factor(self, 
-                               detected: List[Tuple[float, float]], 
-                               expected: List[Tuple[float, float]]) -> float:
-        """Calculate scale factor between detected and expected shapes"""
+                               detected: np.ndarray, 
+                               expected: np.ndarray) -> float:
+        """Calculate scale factor between detected and expected (N, 2) vertex arrays"""
         if len(detected) < 2 or len(expected) < 2:
             return 1.0
         
-        # Calculate distances between adjacent vertices
-        detected_distances = []
-        expected_distances = []
-        
-        for i in range(len(detected) - 1):
-            d1 = math.dist(detected[i], detected[i + 1])
-            d2 = math.dist(expected[i], expected[i + 1])
-            detected_distances.append(d1)
-            expected_distances.append(d2)
-        
-        # Calculate scale factor as ratio of average distances
-        if expected_distances and any(d > 0 for d in expected_distances):
-            avg_detected = np.mean([d for d in detected_distances if d > 0])
-            avg_expected = np.mean([d for d in expected_distances if d > 0])
-            return avg_detected / avg_expected if avg_expected > 0 else 1.0
-        
-        return 1.0
+        # Scale factor as ratio of average distances between adjacent vertices
+        return float(_scale_factor_kernel(detected, expected))
     
     def _calculate_rotation_angle(self, 
-                                 detected: List[Tuple[float, float]], 
-                                 expected: List[Tuple[float, float]]) -> float:
+                                 detected: np.ndarray, 
+                                 expected: np.ndarray) -> float:
         """Calculate rotation angle between detected and expected shapes"""
         if len(detected) < 2 or len(expected) < 2:
             return 0.0
         
-        # Calculate vectors from first vertex to others
-        detected_vectors = []
-        expected_vectors = []
-        
-        for i in range(1, len(detected)):
-            v1 = (detected[i][0] - detected[0][0], detected[i][1] - detected[0][1])
-            v2 = (expected[i][0] - expected[0][0], expected[i][1] - expected[0][1])
-            detected_vectors.append(v1)
-            expected_vectors.append(v2)
-        
-        # Calculate average rotation angle
-        angles = []
-        for d_vec, e_vec in zip(detected_vectors, expected_vectors):
-            if any(d_vec) and any(e_vec):  # Check for non-zero vectors
-                cos_angle = np.dot(d_vec, e_vec) / (np.linalg.norm(d_vec) * np.linalg.norm(e_vec))
-                cos_angle = np.clip(cos_angle, -1, 1)
-                angle = np.arccos(cos_angle) * 180 / np.pi
-                angles.append(angle)
-        
-        return np.mean(angles) if angles else 0.0
+        # Compare vectors from the first vertex to the others, over the shared vertices
+        return float(_rotation_angle_kernel(detected, expected))
     
     def _calculate_position_error(self, 
-                                 detected: List[Tuple[float, float]], 
-                                 expected: List[Tuple[float, float]]) -> float:
+                                 detected: np.ndarray, 
+                                 expected: np.ndarray) -> float:
         """Calculate average position error between corresponding vertices"""
-        if len(detected) != len(expected):
+        if len(detected) != len(expected) or len(detected) == 0:
             return float('inf')
         
-        errors = []
-        for d_vertex, e_vertex in zip(detected, expected):
-            error = math.dist(d_vertex, e_vertex)
-            errors.append(error)
-        
-        return np.mean(errors) if errors else float('inf')
+        return float(_position_error_kernel(detected, expected))
     
     def _calculate_overall_accuracy(self, 
                                    scale_factor: float, 
@@ -334,27 +513,44 @@ class VisualMarker:
                                    expected_shape: Dict) -> float:
         """Calculate overall accuracy score based on geometric measurements"""
         
-        # Get tolerance values from expected shape
+        scale_tolerance, rotation_tolerance, position_tolerance = self._accuracy_tolerances(expected_shape)
+        
+        return float(_overall_accuracy_kernel(
+            float(scale_factor), float(rotation_angle), float(position_error),
+            scale_tolerance, rotation_tolerance, position_tolerance
+        ))
+    
+    def _calculate_overall_accuracy_batch(self,
+                                         scale_factor: np.ndarray,
+                                         rotation_angle: np.ndarray,
+                                         position_error: np.ndarray,
+                                         expected_shape: Dict) -> np.ndarray:
+        """
+        Overall accuracy for many candidate measurements at once; the inputs
+        broadcast against each other (e.g. a meshgrid of candidate fits)
+        """
+        scale_tolerance, rotation_tolerance, position_tolerance = self._accuracy_tolerances(expected_shape)
+        if not (scale_tolerance and rotation_tolerance and position_tolerance):
+            # Match the scalar kernel instead of producing inf/nan scores
+            raise ZeroDivisionError('float division by zero')
+        
+        scale_score = np.maximum(0.0, 1 - np.abs(np.asarray(scale_factor, dtype=np.float64) - 1.0) / scale_tolerance)
+        rotation_score = np.maximum(0.0, 1 - np.abs(np.asarray(rotation_angle, dtype=np.float64)) / rotation_tolerance)
+        position_score = np.maximum(0.0, 1 - np.asarray(position_error, dtype=np.float64) / position_tolerance)
+        
+        # Same weights as the scalar kernel: scale, rotation, position
+        overall_score = scale_score * 0.3 + rotation_score * 0.3 + position_score * 0.4
+        
+        return np.clip(overall_score, 0.0, 1.0)
+    
+    def _accuracy_tolerances(self, expected_shape: Dict) -> Tuple[float, float, float]:
+        """Scale, rotation (degrees) and position (grid units) tolerances of an expected shape"""
         tolerances = expected_shape.get('tolerance', {})
-        scale_tolerance = tolerances.get('scale', 0.1)
-        rotation_tolerance = tolerances.get('rotation', 5.0)  # degrees
-        position_tolerance = tolerances.get('position', 1.0)  # grid units
-        
-        # Calculate individual scores
-        scale_score = max(0, 1 - abs(scale_factor - 1.0) / scale_tolerance)
-        rotation_score = max(0, 1 - abs(rotation_angle) / rotation_tolerance)
-        position_score = max(0, 1 - position_error / position_tolerance)
-        
-        # Weight the scores (you can adjust these weights)
-        weights = [0.3, 0.3, 0.4]  # scale, rotation, position
-        
-        overall_score = (
-            scale_score * weights[0] +
-            rotation_score * weights[1] +
-            position_score * weights[2]
+        return (
+            float(tolerances.get('scale', 0.1)),
+            float(tolerances.get('rotation', 5.0)),
+            float(tolerances.get('position', 1.0))
         )
-        
-        return max(0, min(1, overall_score))
     
     def mark_visual_question(self, 
                             image_path: str, 
@@ -362,11 +558,8 @@ class VisualMarker:
         """Main method to mark a visual question"""
         
         try:
-            # Preprocess image
-            binary_image = self.preprocess_image(image_path)
-            
-            # Detect shapes
-            detected_shapes = self.detect_shapes(binary_image)
+            # Preprocess image and detect shapes (cached per image file)
+            detected_shapes = self._detect_cached(image_path)
             
             if not detected_shapes:
                 return {
@@ -399,7 +592,7 @@ class VisualMarker:
                 'detected_shapes': [
                     {
                         'type': shape.shape_type,
-                        'vertices': shape.vertices,
+                        'vertices': shape.vertices.tolist(),
                         'confidence': shape.confidence
                     }
                     for shape in detected_shapes
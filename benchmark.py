@@ -1,32 +1,33 @@
 import json
 import sys
+import base64
 import os
 import re
+import numpy as np
 import requests
+from concurrent.futures import ThreadPoolExecutor
 
 def load_results(path):
     with open(path, 'r') as f:
         return json.load(f)
 
-def score_question(app_mark, correct_mark):
-    if app_mark == correct_mark:
-        return 100
-    elif abs(app_mark - correct_mark) == 1:
-        return 50
-    else:
-        return 0
-
 def benchmark(app_results, correct_results):
-    scores = []
     correct_map = {str(q['question_number']): q['marks_awarded'] for q in correct_results['results']}
+    q_nums, app_marks, correct_marks = [], [], []
     for q in app_results['results']:
         q_num = str(q['question_number'])
-        app_mark = q['marks_awarded']
         correct_mark = correct_map.get(q_num)
         if correct_mark is not None:
-            percent = score_question(app_mark, correct_mark)
-            scores.append((q_num, percent))
-    overall = sum([s[1] for s in scores]) / len(scores) if scores else 0
+            q_nums.append(q_num)
+            app_marks.append(q['marks_awarded'])
+            correct_marks.append(correct_mark)
+    if not q_nums:
+        return 0, []
+    # 100% for an exact mark, 50% when one mark out, otherwise 0%
+    diff = np.abs(np.asarray(app_marks, dtype=np.float64) - np.asarray(correct_marks, dtype=np.float64))
+    percents = np.where(diff == 0, 100, np.where(diff == 1, 50, 0))
+    scores = list(zip(q_nums, percents.tolist()))
+    overall = float(percents.mean())
     return overall, scores
 
 def find_pairs(folder):
@@ -40,29 +41,56 @@ def find_pairs(folder):
             pairs.append((app_file, correct_file))
     return pairs
 
+# Multiple of 3 bytes, so each chunk base64-encodes without padding
+PDF_CHUNK_SIZE = 3 * 65536
+
+def iter_base64(path, chunk_size=PDF_CHUNK_SIZE):
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            yield base64.b64encode(chunk)
+
+class StreamingJSONBody:
+    """Request body yielded piece by piece, with a known length so requests
+    sends Content-Length instead of chunked transfer encoding"""
+    def __init__(self, parts, length):
+        self.parts = parts
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        for part in self.parts:
+            yield from part
+
 def post_to_mark_endpoint(mark_scheme_pdf, student_paper_pdf, endpoint_url):
-    def read_pdf(path):
-        with open(path, 'rb') as f:
-            return f.read()
-    files = [
-        {
-            'data': read_pdf(mark_scheme_pdf),
-            'type': 'application/pdf',
-        },
-        {
-            'data': read_pdf(student_paper_pdf),
-            'type': 'application/pdf',
-        },
-    ]
-    # Encode binary data as base64 for JSON transport
-    import base64
-    for f in files:
-        f['data'] = base64.b64encode(f['data']).decode('utf-8')
-    payload = {'files': files}
+    # Build {"files": [{"data": <base64>, "type": "application/pdf"}, ...]} without
+    # holding whole PDFs (or their base64 text) in memory
+    paths = [mark_scheme_pdf, student_paper_pdf]
+    head, sep, tail = b'{"files":[', b',', b']}'
+    file_head, file_tail = b'{"data":"', b'","type":"application/pdf"}'
+    parts = [[head]]
+    length = len(head) + len(tail) + len(sep) * (len(paths) - 1)
+    for i, path in enumerate(paths):
+        if i:
+            parts.append([sep])
+        parts.extend([[file_head], iter_base64(path), [file_tail]])
+        length += len(file_head) + 4 * -(-os.path.getsize(path) // 3) + len(file_tail)
+    parts.append([tail])
     headers = {'Content-Type': 'application/json'}
-    response = requests.post(endpoint_url, data=json.dumps(payload), headers=headers)
+    response = requests.post(endpoint_url, data=StreamingJSONBody(parts, length), headers=headers)
     return response.json(), response.status_code
 
+# The marking endpoint is I/O-bound from here, so examples can be in flight together
+MAX_CONCURRENT_REQUESTS = 8
+
+def run_one(task):
+    prefix, mark_scheme_pdf, student_paper_pdf, correct_result_file, endpoint_url = task
+    response = None
+    if os.path.exists(mark_scheme_pdf) and os.path.exists(student_paper_pdf):
+        response = post_to_mark_endpoint(mark_scheme_pdf, student_paper_pdf, endpoint_url)
+    return prefix, response, correct_result_file
+
 if __name__ == "__main__":
     if len(sys.argv) != 2:
         print("Usage: python benchmark.py <folder>")
@@ -74,26 +102,35 @@ if __name__ == "__main__":
     example_prefixes = [f.replace('_correct_result.json', '') for f in os.listdir(folder) if f.endswith('_correct_result.json')]
     example_prefixes.sort()
     endpoint_url = 'http://localhost:3000/api/mark'
+    tasks = [
+        (
+            prefix,
+            os.path.join(folder, f"{prefix}_mark_scheme.pdf"),
+            os.path.join(folder, f"{prefix}_student_paper.pdf"),
+            os.path.join(folder, f"{prefix}_correct_result.json"),
+            endpoint_url,
+        )
+        for prefix in example_prefixes
+    ]
     all_overall = []
-    for prefix in example_prefixes:
-        mark_scheme_pdf = os.path.join(folder, f"{prefix}_mark_scheme.pdf")
-        student_paper_pdf = os.path.join(folder, f"{prefix}_student_paper.pdf")
-        correct_result_file = os.path.join(folder, f"{prefix}_correct_result.json")
-        print(f"\nExample: {prefix}")
-        if os.path.exists(mark_scheme_pdf) and os.path.exists(student_paper_pdf):
-            result, status = post_to_mark_endpoint(mark_scheme_pdf, student_paper_pdf, endpoint_url)
-            print(f"API status: {status}")
-            if os.path.exists(correct_result_file):
-                correct_results = load_results(correct_result_file)
-                overall, per_question = benchmark(result, correct_results)
-                all_overall.append(overall)
-                print(f"  Overall Score: {overall:.2f}%")
-                print("  Per Question Scores:")
-                for q_num, score in per_question:
-                    print(f"    Q{q_num}: {score}%")
+    # Post examples concurrently; results come back in order and are printed here
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as ex:
+        for prefix, response, correct_result_file in ex.map(run_one, tasks):
+            print(f"\nExample: {prefix}")
+            if response is not None:
+                result, status = response
+                print(f"API status: {status}")
+                if os.path.exists(correct_result_file):
+                    correct_results = load_results(correct_result_file)
+                    overall, per_question = benchmark(result, correct_results)
+                    all_overall.append(overall)
+                    print(f"  Overall Score: {overall:.2f}%")
+                    print("  Per Question Scores:")
+                    for q_num, score in per_question:
+                        print(f"    Q{q_num}: {score}%")
+                else:
+                    print("  Correct result file not found for API benchmark.")
             else:
-                print("  Correct result file not found for API benchmark.")
-        else:
-            print("  PDF files not found for API test.")
+                print("  PDF files not found for API test.")
     if all_overall:
         print(f"\nAverage Overall Score across all examples: {sum(all_overall)/len(all_overall):.2f}%")
@@ -1,5 +1,14 @@
 import os
-import base64
+import json
+import time
+import asyncio
+import hashlib
+import sqlite3
+import mmap
+import binascii
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import pytesseract
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI 
@@ -15,9 +24,20 @@ GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 os.environ["OPENAI_API_KEY"] = OPEN_API_KEY
 os.environ["LANGSMITH_API_KEY"] = LANG_CHAIN_KEY
 os.environ["GOOGLE_API_KEY"] = GOOGLE_API_KEY
-os.environ["LANGSMITH_TRACING"] = "true" 
+# Tracing posts every call to LangSmith; opt in with MARKIT_TRACING=true
+os.environ["LANGSMITH_TRACING"] = os.getenv("MARKIT_TRACING", "false")
 
-llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0)
+MODEL_NAME = "gemini-2.5-flash"
+CACHE_PATH = ".mark_cache.db"
+# Uploaded PDF URIs by SHA-256; Gemini deletes uploaded files after 48 hours
+FILE_REFS_PATH = ".file_refs.json"
+FILE_REF_TTL = 47 * 3600
+# Batches upload their mark schemes from several threads at once
+FILE_REFS_LOCK = threading.Lock()
+# Upper bound on threads reading, encoding or uploading files for one request
+MAX_LOAD_WORKERS = 8
+
+llm = ChatGoogleGenerativeAI(model=MODEL_NAME, temperature=0)
 
 system_prompt = '''
 You are a highly experienced UK maths examiner. You mark papers according to national standards with precision, consistency, and clear justification. 
@@ -67,64 +87,172 @@ Your task is to:
 - If question numbers or formats are unclear, do your best to match answers to the correct scheme section.
 '''
 
-with open("answer.jpeg", "rb") as image_file:
-          image_data = base64.b64encode(image_file.read()).decode("utf-8")
+batch_prompt = '''
 
-with open("mark_scheme.pdf", "rb") as image_file:
-          pdf_data= base64.b64encode(image_file.read()).decode("utf-8")
+## TASK OVERVIEW
 
-with open("multi_mark_answers.pdf", "rb") as multi_data:
-          paper_data = base64.b64encode(multi_data.read()).decode("utf-8")
+You have been provided with:
 
-with open("upTo13.pdf", "rb") as q_data:
-          mark_scheme = base64.b64encode(q_data.read()).decode("utf-8")
+1. One or more **Mark Schemes**, each under a "Mark scheme N" header — the official marking criteria for a maths exam paper.
+2. Several **Student Scripts**, each under a "Script N (mark scheme M)" header — the scanned answers submitted by one student, to be marked against mark scheme M.
 
-with open("q_11.jpeg", "rb") as question_eleven:
-          paper = base64.b64encode(question_eleven.read()).decode("utf-8")
+Your task is to, for every script:
+- Read and apply its mark scheme strictly when assessing the script.
+- Award full or partial marks per question based only on what is in the mark scheme.
+- Give a brief explanation (1–2 sentences) per question to justify your marking.
+- Highlight any errors or misconceptions.
+- Offer a concise tip on how the student could improve, if relevant.
 
+## RULES
 
-messages = [
-        SystemMessage(
+- Only use the information contained in the attached files.
+- Mark each script independently; never carry evidence from one script over to another.
+- Do not make assumptions outside the scope of the mark scheme.
+- Be concise but informative and maintain a helpful, constructive tone.
+- Use UK GCSE or A-Level standards depending on the content.
+- If question numbers or formats are unclear, do your best to match answers to the correct scheme section.
+'''
+
+def b64_file(path):
+    # Encode straight from a read-only memory map, so the file is never
+    # copied into a bytes object before encoding
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return binascii.b2a_base64(mm, newline=False).decode("ascii")
+
+@functools.lru_cache(maxsize=32)
+def b64_cached(path, mtime_ns):
+    # mtime_ns is part of the cache key so an edited file is encoded again
+    return b64_file(path)
+
+def load_b64(path):
+    # Only files used by the message list being built are read and encoded
+    return b64_cached(path, os.stat(path).st_mtime_ns)
+
+def load_b64_all(paths):
+    # Reads and encodes release the GIL, so independent files overlap
+    with ThreadPoolExecutor(max(1, min(len(paths), MAX_LOAD_WORKERS))) as ex:
+        return list(ex.map(load_b64, paths))
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_file_refs():
+    try:
+        with open(FILE_REFS_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_file_refs(refs):
+    # Write to a temporary file and rename over the old one, so an
+    # interrupted run never leaves a truncated refs file behind
+    tmp_path = FILE_REFS_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(refs, f)
+    os.replace(tmp_path, FILE_REFS_PATH)
+
+def upload_pdf(path):
+    # Upload once to the Gemini Files API and remember the URI by content hash,
+    # so later runs reference the PDF instead of re-sending it as base64.
+    # Returns None (inline base64 is used instead) when the chat model is not
+    # Gemini or the upload fails for any reason.
+    if not isinstance(llm, ChatGoogleGenerativeAI):
+        return None
+    digest = file_sha256(path)
+    refs = load_file_refs()
+    ref = refs.get(digest)
+    if ref and ref["expires"] > time.time() + 3600:
+        return ref["uri"]
+    try:
+        import google.generativeai as genai
+        genai.configure(api_key=GOOGLE_API_KEY)
+        uploaded = genai.upload_file(path, mime_type="application/pdf")
+    except Exception as e:
+        print(f'upload of {path} failed, sending it inline: {e}')
+        return None
+    with FILE_REFS_LOCK:
+        # Re-read under the lock so concurrent uploads don't drop each other's refs
+        refs = load_file_refs()
+        refs[digest] = {"uri": uploaded.uri, "expires": time.time() + FILE_REF_TTL}
+        save_file_refs(refs)
+    return uploaded.uri
+
+def mark_scheme_block(path, filename="mark_scheme"):
+    # Every mark scheme PDF goes through here: a file reference once uploaded,
+    # otherwise inline base64
+    uri = upload_pdf(path)
+    if uri is not None:
+        return {"type": "media", "file_uri": uri, "mime_type": "application/pdf"}
+    return {
+        "type": "file", 
+        "source_type": "base64",
+        "mime_type": "application/pdf",
+        "data": load_b64(path),
+        "filename": filename,
+    }
+
+@functools.lru_cache(maxsize=1)
+def build_system():
+    # Built once: the system prompt, the mark scheme and the marking
+    # instructions form an identical prefix for every student, so the same
+    # objects are shared and provider-side prompt caching can match it
+    system = SystemMessage(
         content=[
             {"type": "text", "text": system_prompt}, 
-        ]),
-        HumanMessage(
-            content=[
-            {
-                "type": "image", 
-                "source_type": "base64",
-                "mime_type": "image/jpeg",
-                "data": image_data,
-            },
-            {
-                "type": "file", 
-                "source_type": "base64",
-                "mime_type": "application/pdf",
-                "data": pdf_data,
-                "filename": "mark_scheme",
-            },
-            {
-                "type": "text",
-                "text": user_prompt
-            },
-           ]
-        )
-]
+        ])
+    scheme = [
+        mark_scheme_block("mark_scheme.pdf"),
+        {
+            "type": "text",
+            "text": user_prompt
+        },
+    ]
+    return system, scheme
+
+def build_student(image_path):
+    return {
+        "type": "image", 
+        "source_type": "base64",
+        "mime_type": "image/jpeg",
+        "data": load_b64(image_path),
+    }
+
+def build_student_messages(image_path):
+    # Per-student content goes last so everything before it stays cacheable.
+    # The shared prefix (read or uploaded on the first call) and the student
+    # image are independent, so they are prepared side by side
+    with ThreadPoolExecutor(2) as ex:
+        prefix = ex.submit(build_system)
+        student = build_student(image_path)
+        system, scheme = prefix.result()
+    return [system, HumanMessage(content=scheme + [student])]
+
+def build_messages():
+    return build_student_messages("answer.jpeg")
 
-multi_mark_messages = [
+def build_multi_mark_messages():
+    # The mark scheme block (an upload or a base64 read) and the paper are
+    # independent, so they are prepared side by side
+    with ThreadPoolExecutor(2) as ex:
+        scheme = ex.submit(mark_scheme_block, "upTo13.pdf", "mark scheme")
+        paper_data = load_b64("multi_mark_answers.pdf")
+        scheme = scheme.result()
+    return [
         SystemMessage(
         content=[
             {"type": "text", "text": system_prompt}, 
         ]),
         HumanMessage(
             content=[
-            {
-                "type": "file", 
-                "source_type": "base64",
-                "mime_type": "application/pdf",
-                "data": mark_scheme,
-                "filename": "mark scheme",
-            },
+            scheme,
            {
                 "type": "file", 
                 "source_type": "base64",
@@ -134,17 +262,123 @@ multi_mark_messages = [
             },
            ]
         )
-]
+    ]
+
+def cache_key(messages):
+    # Exact-match key over the model and every message block (prompts and
+    # base64 file data), so re-marking the same files never hits the API
+    digest = hashlib.sha256(MODEL_NAME.encode("utf-8"))
+    for message in messages:
+        digest.update(type(message).__name__.encode("utf-8"))
+        digest.update(json.dumps(message.content, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+def cache_get(key):
+    with sqlite3.connect(CACHE_PATH) as db:
+        db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, content TEXT)")
+        row = db.execute("SELECT content FROM responses WHERE key = ?", (key,)).fetchone()
+    if row is not None:
+        print('cache hit')
+        return row[0]
+    return None
+
+def cache_put(key, content):
+    with sqlite3.connect(CACHE_PATH) as db:
+        db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?)", (key, content))
+
+def cached_invoke(messages):
+    key = cache_key(messages)
+    content = cache_get(key)
+    if content is None:
+        content = llm.invoke(messages).content
+        cache_put(key, content)
+    return content
+
+async def mark_one(sem, messages):
+    # Hashing the multi-MB payload and the sqlite calls block, so they run on
+    # the default executor instead of stalling every other task on the loop
+    loop = asyncio.get_running_loop()
+    key = await loop.run_in_executor(None, cache_key, messages)
+    content = await loop.run_in_executor(None, cache_get, key)
+    if content is None:
+        # The semaphore bounds in-flight requests to stay under the rate limit
+        async with sem:
+            content = (await llm.ainvoke(messages)).content
+        await loop.run_in_executor(None, cache_put, key, content)
+    return content
+
+def invoke_all(all_messages, concurrency=8):
+    # Overlap the network waits: N message lists take about as long as the slowest
+    async def run():
+        sem = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*[mark_one(sem, m) for m in all_messages])
+    return asyncio.run(run())
 
 def invoke(messages):
     print('invoking llm')
-    response = llm.invoke(messages)
-    print(response)
-    print(response.content)
+    content = cached_invoke(messages)
+    print(content)
 
-def isFrontPage(filename):
+def build_batch_messages(papers):
+    # One request for many scripts: the system prompt and instructions are sent
+    # once, each distinct mark scheme PDF once (a class usually shares one),
+    # then each script's answer image under a header naming its mark scheme
+    schemes = list(dict.fromkeys(pdf_path for _, pdf_path in papers))
+    scheme_index = {path: i for i, path in enumerate(schemes)}
+    # Scheme blocks (uploads or base64 reads) are prepared while the images encode
+    with ThreadPoolExecutor(max(1, min(len(schemes), MAX_LOAD_WORKERS))) as ex:
+        scheme_blocks = ex.map(mark_scheme_block, schemes,
+                               [f"mark_scheme_{i}" for i in range(len(schemes))])
+        images = load_b64_all([image_path for image_path, _ in papers])
+        scheme_blocks = list(scheme_blocks)
+    content = [{"type": "text", "text": batch_prompt}]
+    for i, block in enumerate(scheme_blocks):
+        content.extend([
+            {"type": "text", "text": f"--- Mark scheme {i} ---"},
+            block,
+        ])
+    for i, (_, pdf_path) in enumerate(papers):
+        content.extend([
+            {"type": "text", "text": f"--- Script {i} (mark scheme {scheme_index[pdf_path]}) ---"},
+            {
+                "type": "image", 
+                "source_type": "base64",
+                "mime_type": "image/jpeg",
+                "data": images[i],
+            },
+        ])
+    content.append({
+        "type": "text",
+        "text": "Return only a JSON array with one object per script, in script order, "
+                "each of the form {\"script_index\": i, \"marks\": <result in the JSON format above>, "
+                "\"feedback\": \"...\"}",
+    })
+    return [
+        SystemMessage(
+        content=[
+            {"type": "text", "text": system_prompt}, 
+        ]),
+        HumanMessage(content=content)
+    ]
+
+def mark(papers):
+    # papers: list of (answer image path, mark scheme pdf path) pairs
+    print(f'invoking llm for {len(papers)} scripts')
+    text = cached_invoke(build_batch_messages(papers)).strip()
+    # Models often wrap JSON in a markdown code fence
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1].rsplit("```", 1)[0]
+    results = json.loads(text)
+    return sorted(results, key=lambda r: r.get("script_index", 0))
+
+@functools.lru_cache(maxsize=32)
+def ocr_text(filename, mtime):
+    # mtime is part of the cache key so an edited image is OCR'd again
     print("Running ocr..")
-    str = pytesseract.image_to_string(filename)
+    return pytesseract.image_to_string(filename)
+
+def isFrontPage(filename):
+    str = ocr_text(filename, os.path.getmtime(filename))
     if 'instructions' in str.lower():
         print('is front page')
     else:
@@ -152,5 +386,5 @@ def isFrontPage(filename):
 
 isFrontPage('front_page.JPG') # expect to be true
 isFrontPage('answer.jpeg') # expect to be false
-invoke(multi_mark_messages)
+invoke(build_multi_mark_messages())
 
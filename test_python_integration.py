@@ -132,6 +132,168 @@ def test_python_integration_script():
         print(f"❌ Python integration script test failed: {e}")
         return False
 
+def test_server_mode():
+    """Test the persistent worker loop in python_integration.py"""
+    print("\n🔁 Testing Persistent Worker Mode")
+    print("=" * 50)
+    
+    try:
+        import io
+        from python_integration import serve
+        
+        requests = [
+            {'mode': 'agreement', 'data': {'marking_results': [
+                {'marks_awarded': 3, 'total_marks': 4},
+                {'marks_awarded': 3, 'total_marks': 4}
+            ]}},
+            {'mode': 'unknown', 'data': {}}
+        ]
+        stdin = io.BytesIO(('\n'.join(json.dumps(r) for r in requests) + '\n').encode())
+        stdout = io.BytesIO()
+        
+        serve(stdin, stdout)
+        
+        responses = [json.loads(line) for line in stdout.getvalue().decode().splitlines()]
+        assert len(responses) == 2
+        assert responses[0]['success'] and responses[0]['confidence_score'] == 1.0
+        assert not responses[1]['success']
+        
+        print(f"✅ Handled {len(responses)} requests in one process")
+        
+    except Exception as e:
+        print(f"❌ Persistent worker test failed: {e}")
+        raise
+
+def test_json_backends_agree():
+    """Test that orjson and the stdlib fallback serialize visual results identically"""
+    print("\n🧾 Testing JSON Output Backends")
+    print("=" * 50)
+    
+    try:
+        import tempfile
+        import cv2
+        import numpy as np
+        import python_integration
+        
+        # A rectangle graded against an expected triangle: no shape matches, so
+        # position_error is inf
+        image = np.full((400, 400, 3), 255, dtype=np.uint8)
+        cv2.rectangle(image, (100, 100), (300, 250), (0, 0, 0), 3)
+        with tempfile.TemporaryDirectory() as tmp:
+            image_path = os.path.join(tmp, 'rectangle.png')
+            cv2.imwrite(image_path, image)
+            result = python_integration.run_visual_marking({
+                'image_path': image_path,
+                'expected_answer': {'shape_type': 'triangle', 'vertices': [[2, 2], [4, 6], [7, 3]]},
+                'grid_spacing': 50.0
+            })
+        
+        assert result['success'] and result['geometric_accuracy'] is not None
+        assert result['geometric_accuracy']['position_error'] == float('inf')
+        # Leave a numpy scalar in the payload as well
+        result['confidence'] = np.float32(result['confidence'])
+        
+        original = python_integration.orjson
+        try:
+            outputs = []
+            for backend in (original, None):
+                python_integration.orjson = backend
+                outputs.append(python_integration.json_dumps(result))
+        finally:
+            python_integration.orjson = original
+        
+        if original is not None:
+            assert outputs[0] == outputs[1]
+        assert json.loads(outputs[1])['geometric_accuracy']['position_error'] is None
+        
+        print(f"✅ Both backends wrote {len(outputs[1])} identical bytes")
+        
+    except Exception as e:
+        print(f"❌ JSON backend test failed: {e}")
+        raise
+
+def test_set_weights_matches_explicit():
+    """Test that set_weights gives bit-identical results to passing weights=, for lists and arrays"""
+    print("\n⚖️  Testing Preset Confidence Weights")
+    print("=" * 50)
+    
+    try:
+        import random
+        import numpy as np
+        from confidence_scorer import ConfidenceScorer
+        
+        rng = random.Random(0)
+        scorer = ConfidenceScorer()
+        for _ in range(2000):
+            weights = [rng.random() for _ in range(rng.randint(1, 5))]
+            scores = [rng.random() for _ in range(rng.randint(1, 5))]
+            expected = scorer.combine_confidence_scores(scores, weights)
+            assert scorer.combine_confidence_scores(np.array(scores), np.array(weights)) == expected
+            scorer.set_weights(weights)
+            assert scorer.combine_confidence_scores(scores) == expected
+            assert scorer.combine_confidence_scores(np.array(scores)) == expected
+        assert scorer.combine_confidence_scores(np.array([])) == 0.0
+        
+        print("✅ Preset and explicit weights agree exactly")
+        
+    except Exception as e:
+        print(f"❌ Preset weights test failed: {e}")
+        raise
+
+def test_keyword_matching():
+    """Test whole-word keyword matching and that both matching paths agree"""
+    print("\n🔤 Testing Keyword Matching")
+    print("=" * 50)
+    
+    try:
+        import random
+        import confidence_scorer
+        from confidence_scorer import ConfidenceScorer, Criterion
+        
+        # Keywords match whole words or phrases, never part of a longer word
+        criterion = Criterion(
+            description="Whole words",
+            marks=1,
+            keywords=["Quadratic", "substitute", "x = 2", "x = 2 or x = 3"]
+        )
+        assert criterion._keyword_pattern.found("solved it quadratically, substituted") == {''}
+        assert criterion._keyword_pattern.count("a quadratic; substitute values") == 2
+        assert criterion._keyword_pattern.count("so x = 25") == 0
+        # A shorter phrase is still found inside a longer matched phrase
+        assert criterion._keyword_pattern.count("x = 2 or x = 3") == 2
+        
+        if confidence_scorer.ahocorasick is None:
+            print("⚠️  pyahocorasick not installed, skipping automaton parity")
+            return
+        
+        # The single-pass automaton must count exactly what _KeywordPattern counts
+        rng = random.Random(0)
+        vocabulary = ["x", "2", "x = 2", "sub", "substitute", "substituted", "area",
+                      "quadratic", "quadratically", "a_b", "total area", "="]
+        separators = [" ", " ", ", ", ".", "-", "_", ""]
+        scorer = ConfidenceScorer()
+        for _ in range(500):
+            mark_scheme = [
+                Criterion(
+                    description=f"Criterion {i}",
+                    marks=1,
+                    keywords=rng.sample(vocabulary, rng.randint(0, 4)),
+                    partial_credit_keywords=rng.sample(vocabulary, rng.randint(0, 3))
+                )
+                for i in range(rng.randint(1, 4))
+            ]
+            answer = "".join(rng.choice(vocabulary) + rng.choice(separators)
+                             for _ in range(rng.randint(0, 12))).lower()
+            expected = [[c._keyword_pattern.count(answer), c._partial_keyword_pattern.count(answer)]
+                        for c in mark_scheme]
+            assert scorer._count_keyword_matches(answer, mark_scheme) == expected, answer
+        
+        print("✅ Whole-word matching holds and both paths agree")
+        
+    except Exception as e:
+        print(f"❌ Keyword matching test failed: {e}")
+        raise
+
 def main():
     """Run all tests"""
     print("🚀 Mark-It: Testing Python Integration")
@@ -141,6 +303,10 @@ def main():
         ("Confidence Scorer", test_confidence_scorer),
         ("Visual Marking", test_visual_marking),
         ("Python Integration Script", test_python_integration_script),
+        ("Persistent Worker", test_server_mode),
+        ("JSON Backends", test_json_backends_agree),
+        ("Preset Weights", test_set_weights_matches_explicit),
+        ("Keyword Matching", test_keyword_matching),
     ]
     
     passed = 0
@@ -148,7 +314,8 @@ def main():
     
     for test_name, test_func in tests:
         try:
-            if test_func():
+            # Older tests return True/False; newer ones raise on failure
+            if test_func() is not False:
                 passed += 1
                 print(f"✅ {test_name}: PASSED")
             else: